@@ -501,15 +501,9 @@ class Configuration:
 				raise MalformedBitstreamError("Block height and width have to be set before writig data") from te
 		
 		def data_to_xram(data, xram):
-			for y in range(bank_height):
-				fst = y*bank_width//8
-				lst = ((y+1)*bank_width+7)//8 # round up
-				# msb first
-				bit_data = [
-					(b<<i) & 0x80 != 0 for c, b in enumerate(data[fst:lst])
-					for i in range(max(0, y*bank_width-8*fst-8*c), min(8, (y+1)*bank_width-8*fst-8*c))
-				]
-				xram[bank_nr][y+bank_offset][0:bank_width] = bit_data
+			# rows are packed without padding, msb first; counterpart of data_from_xram
+			bit_data = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=bank_width*bank_height, bitorder="big")
+			xram[bank_nr, bank_offset:bank_offset+bank_height, :bank_width] = bit_data.reshape(bank_height, bank_width)
 			
 		
 		cram = self._all_blank_cram_banks()
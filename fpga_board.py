@@ -2,16 +2,18 @@
 
 import logging
 import os
-import signal
 import subprocess
 import time
 
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
 
 import pyftdi.serialext
 
 from serial import SerialBase
 from pyftdi.ftdi import Ftdi
+from pyftdi.usbtools import UsbDeviceDescriptor, UsbTools
 
 from .configuration import BinOpt, Configuration
 from .serial_utils import is_valid_serial_number
@@ -29,16 +31,40 @@ class FPGABoard:
 	CDONE = 1 << 6 # ADBUS6
 	CRESET = 1 << 7 # ADBUS7
 	
+	CDONE_REQUEST = bytes((Ftdi.GET_BITS_LOW, Ftdi.SEND_IMMEDIATE))
+	
+	SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+	# size of the USB bulk transfers when flashing a bitstream
+	FLASH_TRANSFER_SIZE = 64 << 10
+	
 	def __init__(self, serial_number: str, baudrate: int=3000000, timeout: float=0.5) -> None:
 		self._log = logging.getLogger(type(self).__name__)
 		self._serial_number = serial_number
 		self._is_open = False
+		# state of defer_flushes
+		self._defer_depth = 0
+		self._pending_rst_output = False
+		self._pending_flush = False
 		self._uart = pyftdi.serialext.serial_for_url(
 			"ftdi://::{}/2".format(self._serial_number),
 			baudrate=baudrate,
 			timeout=timeout
 		)
 		self._direction = self.SCK|self.MOSI|self.CS|self.CRESET
+		# fixed parts of the flash command
+		self._flash_prelude = bytes((
+			Ftdi.SET_BITS_LOW, self.MOSI|self.CS|self.CRESET, self._direction, # chip select high
+			Ftdi.CLK_BITS_NO_DATA, 0x07, # 8 dummy clocks
+			Ftdi.SET_BITS_LOW, self.MOSI|self.CRESET, self._direction # chip select low
+		))
+		self._flash_postlude = bytes((
+			Ftdi.SET_BITS_LOW, self.MOSI|self.CS|self.CRESET, self._direction, # chip select high
+			Ftdi.CLK_BYTES_NO_DATA, 0x0b, 0x00, Ftdi.CLK_BITS_NO_DATA, 0x03 # 100 clocks for CDONE to go high
+		))
+		self._flash_epilogue = bytes((
+			Ftdi.CLK_BYTES_NO_DATA, 0x05, 0x00, Ftdi.CLK_BITS_NO_DATA, 0x00, # 49 clocks
+			Ftdi.SET_BITS_LOW, self._direction, self._direction
+		))
 		self._mpsse_dev = Ftdi()
 		#self._mpsse_dev.log.setLevel(logging.DEBUG)
 		self._mpsse_dev.open_mpsse_from_url(
@@ -84,14 +110,45 @@ class FPGABoard:
 		self._is_open = False
 	
 	def reset_buffer(self, rst_input: bool=True, rst_output: bool=True) -> None:
+		# input is reset immediately even in defer_flushes, as it has to protect the following reads
 		if rst_input:
 			self._uart.reset_input_buffer()
+		
 		if rst_output:
-			self._uart.reset_output_buffer()
+			if self._defer_depth > 0:
+				self._pending_rst_output = True
+			else:
+				self._uart.reset_output_buffer()
 	
 	def flush(self) -> None:
+		if self._defer_depth > 0:
+			self._pending_flush = True
+			return
+		
 		self._uart.flush()
 	
+	@contextmanager
+	def defer_flushes(self) -> Iterator[None]:
+		"""Coalesce output buffer resets and flushes in the context to a single call each when leaving the context
+		
+		Each of these calls costs a USB control transfer, so doing them only once saves the latency of the others.
+		Input buffer resets are not deferred, as deferring them would discard input received in the context.
+		Contexts can be nested, the pending calls are done when the outermost context is left.
+		"""
+		self._defer_depth += 1
+		try:
+			yield
+		finally:
+			self._defer_depth -= 1
+			if self._defer_depth == 0:
+				rst_output, self._pending_rst_output = self._pending_rst_output, False
+				do_flush, self._pending_flush = self._pending_flush, False
+				
+				if do_flush:
+					self.flush()
+				if rst_output:
+					self.reset_buffer(False, True)
+	
 	def __enter__(self) -> "FPGABoard":
 		self._uart.reset_input_buffer()
 		return self
@@ -154,44 +211,58 @@ class FPGABoard:
 		self.usleep(1200)
 		
 		# construct flashing as single command
-		cmd = bytearray((
-			Ftdi.SET_BITS_LOW, self.MOSI|self.CS|self.CRESET, self._direction, # chip select high
-			Ftdi.CLK_BITS_NO_DATA, 0x07, # 8 dummy clocks
-			Ftdi.SET_BITS_LOW, self.MOSI|self.CRESET, self._direction # chip select low
-		))
+		# preallocate the whole command and copy the bitstream chunks directly into it
+		chunk_size = 4096
+		chunk_count = (len(bitstream) + chunk_size - 1) // chunk_size
+		fixed_parts = (self._flash_postlude, self._flash_epilogue, self.CDONE_REQUEST)
+		cmd = bytearray(
+			len(self._flash_prelude) + 3*chunk_count + len(bitstream) + sum(len(f) for f in fixed_parts)
+		)
+		# chip select high, 8 dummy clocks, chip select low
+		pos = len(self._flash_prelude)
+		cmd[:pos] = self._flash_prelude
 		
 		# send bitstream
-		chunk_size = 4096
+		bitstream_view = memoryview(bitstream)
 		for i in range(0, len(bitstream), chunk_size):
-			data = bitstream[i:i+chunk_size]
-			cmd.append(Ftdi.WRITE_BYTES_NVE_MSB)
+			data = bitstream_view[i:i+chunk_size]
 			len_data = len(data) - 1
-			cmd.append(len_data & 0xff)
-			cmd.append(len_data >> 8)
-			cmd.extend(data)
+			cmd[pos] = Ftdi.WRITE_BYTES_NVE_MSB
+			cmd[pos+1] = len_data & 0xff
+			cmd[pos+2] = len_data >> 8
+			pos += 3
+			cmd[pos:pos+len(data)] = data
+			pos += len(data)
 		
+		# chip select to high and wait 100 SPI clock cycles for CDONE to go high
+		cmd[pos:pos+len(self._flash_postlude)] = self._flash_postlude
+		pos += len(self._flash_postlude)
 		
-		# chip select to high
-		self._extend_by_gpio(cmd, self.MOSI|self.CS|self.CRESET)
+		# wait at least 49 SPI clock cycles
+		# they are clocked regardless of CDONE, a failed configuration is aborted afterwards anyway
+		cmd[pos:pos+len(self._flash_epilogue)] = self._flash_epilogue
+		pos += len(self._flash_epilogue)
 		
-		# wait 100 SPI clock cycles for CDONE to go high
-		cmd.extend((Ftdi.CLK_BYTES_NO_DATA, 0x0b, 0x00, Ftdi.CLK_BITS_NO_DATA, 0x03))
+		# request CDONE in the same command, so reading it is the only round trip
+		cmd[pos:pos+len(self.CDONE_REQUEST)] = self.CDONE_REQUEST
 		
 		self._log.debug("Write flash command")
-		self._mpsse_dev.write_data(cmd)
+		# large bulk transfers keep several URBs queued at the host controller, so the USB bus doesn't idle between
+		# chunks of the default FIFO size
+		prev_chunk_size = self._mpsse_dev.write_data_get_chunksize()
+		self._mpsse_dev.write_data_set_chunksize(self.FLASH_TRANSFER_SIZE)
+		try:
+			self._mpsse_dev.write_data(cmd)
+		finally:
+			self._mpsse_dev.write_data_set_chunksize(prev_chunk_size)
 		
 		self._log.debug("Check success of flash")
 		# check CDONE
-		if self._get_cdone():
+		if self._read_cdone():
 			self._log.debug("CDONE: high, programming successful")
 		else:
 			raise ConfigurationError("Programming failed")
 		
-		# wait at least 49 SPI clock cycles
-		cmd = bytearray((Ftdi.CLK_BYTES_NO_DATA, 0x05, 0x00, Ftdi.CLK_BITS_NO_DATA, 0x00))
-		self._extend_by_gpio(cmd, self._direction)
-		self._mpsse_dev.write_data(cmd)
-		
 		# SPI pins now also available as user IO (from the FPGA perspective), but they are not used
 	
 	def _set_gpio_out(self, value: int) -> None:
@@ -203,8 +274,11 @@ class FPGABoard:
 		cmd.extend((Ftdi.SET_BITS_LOW, value, self._direction))
 	
 	def _get_cdone(self) -> bool:
-		cmd = bytes((Ftdi.GET_BITS_LOW, Ftdi.SEND_IMMEDIATE))
-		self._mpsse_dev.write_data(cmd)
+		self._mpsse_dev.write_data(self.CDONE_REQUEST)
+		return self._read_cdone()
+	
+	def _read_cdone(self) -> bool:
+		"""read the answer to CDONE_REQUEST"""
 		gpio = self._mpsse_dev.read_data_bytes(1, 4)[0]
 		return (gpio & self.CDONE) != 0
 	
@@ -215,23 +289,23 @@ class FPGABoard:
 			cmd.append("-z")
 		cls.no_int_subprocess(cmd)
 	
-	@staticmethod
-	def ignore_sigint() -> None:
-		signal.signal(signal.SIGINT, signal.SIG_IGN)
-	
 	@classmethod
 	def no_int_subprocess(cls, cmd: List[str]) -> str:
 		"""run subprocess so it doesn't receive SIGINT"""
 		
-		out = subprocess.check_output(
+		# a new session detaches the subprocess from the terminal's process group, so SIGINT from the terminal
+		# doesn't reach it; unlike preexec_fn this keeps the fast spawn path and is safe with threads
+		res = subprocess.run(
 			cmd,
 			stdin=subprocess.DEVNULL,
+			stdout=subprocess.PIPE,
 			stderr=subprocess.STDOUT,
-			preexec_fn=cls.ignore_sigint,
+			start_new_session=True,
+			check=True,
 			#text=True, # only from Python version 3.7 on
 			universal_newlines=True
 		)
-		return out
+		return res.stdout
 	
 	@classmethod
 	def get_suitable_board(cls, baudrate: int=3000000, timeout: float=0.5, black_list: Optional[List[str]]=None) -> "FPGABoard":
@@ -247,9 +321,11 @@ class FPGABoard:
 		
 		return cls(suitable.pop(), baudrate, timeout)
 	
-	@staticmethod
-	def get_suitable_serial_numbers() -> List[str]:
-		ft2232_devices = Ftdi.find_all([(0x0403, 0x6010)], True)
+	@classmethod
+	def get_suitable_serial_numbers(cls) -> List[str]:
+		ft2232_devices = cls.find_ft2232_devices_sysfs()
+		if ft2232_devices is None:
+			ft2232_devices = Ftdi.find_all([(0x0403, 0x6010)], True)
 		
 		suitable = []
 		for desc, i_count in ft2232_devices:
@@ -258,6 +334,80 @@ class FPGABoard:
 		
 		return suitable
 	
+	@classmethod
+	def find_ft2232_devices(cls, max_workers: int=16) -> List[Tuple[UsbDeviceDescriptor, int]]:
+		"""Find all FT2232H devices, equivalent to Ftdi.find_all([(0x0403, 0x6010)], True)
+		
+		Reading the string descriptors requires a control transfer for each device. These transfers are independent
+		from each other, so they are issued in parallel to avoid a startup time that scales with the number of boards.
+		
+		The devices are enumerated by the private UsbTools._find_devices(vendor, product, nocache) of pyftdi (checked
+		with pyftdi 0.57). If it is not available in this form, Ftdi.find_all is used instead.
+		"""
+		try:
+			with UsbTools.Lock:
+				devices = list(UsbTools._find_devices(0x0403, 0x6010, True))
+		except (AttributeError, TypeError):
+			# private API changed, fall back to the sequential public one
+			return Ftdi.find_all([(0x0403, 0x6010)], True)
+		
+		if len(devices) < 2:
+			return [cls._describe_device(d) for d in devices]
+		
+		with ThreadPoolExecutor(max_workers=min(max_workers, len(devices))) as executor:
+			return list(executor.map(cls._describe_device, devices))
+	
+	@classmethod
+	def find_ft2232_devices_sysfs(cls) -> Optional[List[Tuple[UsbDeviceDescriptor, int]]]:
+		"""Find all FT2232H devices by reading the attributes exposed by Linux in sysfs
+		
+		In contrast to Ftdi.find_all no device is opened, so no control transfers are necessary and other processes
+		using the devices are not disturbed.
+		Returns None if sysfs is not available.
+		"""
+		if not os.path.isdir(cls.SYSFS_USB_DEVICES):
+			return None
+		
+		def read_attr(dev_path, name):
+			try:
+				with open(os.path.join(dev_path, name), "r") as attr_file:
+					return attr_file.read().strip()
+			except FileNotFoundError:
+				return None
+		
+		ft2232_devices = []
+		with os.scandir(cls.SYSFS_USB_DEVICES) as dir_iter:
+			for entry in dir_iter:
+				try:
+					if read_attr(entry.path, "idVendor") != "0403" or read_attr(entry.path, "idProduct") != "6010":
+						continue
+					
+					desc = UsbDeviceDescriptor(
+						0x0403,
+						0x6010,
+						int(read_attr(entry.path, "busnum")),
+						int(read_attr(entry.path, "devnum")),
+						read_attr(entry.path, "serial"),
+						None,
+						read_attr(entry.path, "product")
+					)
+					i_count = int(read_attr(entry.path, "bNumInterfaces"))
+				except (OSError, TypeError, ValueError):
+					# device vanished or incomplete attributes
+					continue
+				
+				ft2232_devices.append((desc, i_count))
+		
+		return ft2232_devices
+	
+	@staticmethod
+	def _describe_device(device) -> Tuple[UsbDeviceDescriptor, int]:
+		i_count = max(cfg.bNumInterfaces for cfg in device)
+		sn = UsbTools.get_string(device, device.iSerialNumber)
+		description = UsbTools.get_string(device, device.iProduct)
+		desc = UsbDeviceDescriptor(device.idVendor, device.idProduct, device.bus, device.address, sn, None, description)
+		return desc, i_count
+	
 	@staticmethod
 	def usleep(usec: float) -> None:
 		time.sleep(usec/1000000)
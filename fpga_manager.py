@@ -6,8 +6,6 @@ from multiprocessing.util import Finalize
 import random
 import logging
 
-from pyftdi.ftdi import Ftdi
-
 from .fpga_board import FPGABoard
 from .serial_utils import check_serial_number, is_valid_serial_number, MalformedSerial
 
@@ -44,11 +42,15 @@ class FPGAManager:
 		self._timeout = timeout
 		
 		#self._boards = {}
-		self._avail_dict = mp_manager.dict()
+		# index in _serial_numbers is the bit position in the availability mask
+		self._serial_numbers = []
+		self._sn_index = {}
+		# the mask is a Python int, so it isn't limited to 64 boards; None marks a closed manager
+		self._avail = mp_manager.Namespace(mask=0)
 		self._avail_lock = mp_manager.Lock()
 		
 		# get list of all available boards
-		ft2232_devices = Ftdi.find_all([(0x0403, 0x6010)], True)
+		ft2232_devices = FPGABoard.find_ft2232_devices()
 		
 		if len(ft2232_devices) < len(sn_set):
 			raise OSError(errno.ENXIO, "More serial numbers requested than devices available")
@@ -77,15 +79,18 @@ class FPGAManager:
 				
 				#new_board = ManagedFPGABoard(self, desc.sn, baudrate, timeout)
 				#self._add_board(new_board)
-				self._avail_dict[desc.sn] = True
+				self._sn_index[desc.sn] = len(self._serial_numbers)
+				self._serial_numbers.append(desc.sn)
+			
+			self._avail.mask = (1 << len(self._serial_numbers)) - 1
 		
 		# check if all requested serial numbers were found
 		if len(sn_set) > 0:
 			self._close_boards()
 			raise OSError(errno.ENXIO, "Couldn't open {} requested boards: {}".format(len(sn_set), sn_set))
 		
-		if len(self._avail_dict) < min_nr:
-			avail = len(self._avail_dict)
+		if len(self._serial_numbers) < min_nr:
+			avail = len(self._serial_numbers)
 			self._close_boards()
 			raise OSError(errno.ENXIO, "Minimum of {} boards requested, only {} available".format(min_nr, avail))
 		
@@ -102,18 +107,31 @@ class FPGAManager:
 	
 	def _close_boards(self):
 		with self._avail_lock:
-			for sn in list(self._avail_dict):
-				if not self._avail_dict.pop(sn):
+			mask = self._avail.mask
+			if mask is None:
+				return
+			for index, sn in enumerate(self._serial_numbers):
+				if not (mask >> index) & 1:
 					self._log.warn(f"board '{sn}' not released properly")
 				#board = self._boards.pop(sn)
 				#board.close()
+			# None marks the manager as closed for all processes
+			self._avail.mask = None
 	
 	def __len__(self):
 		with self._avail_lock:
-			return len(self._avail_dict)
+			if self._avail.mask is None:
+				return 0
+			return len(self._serial_numbers)
+	
+	def _board_index(self, serial_number, mask):
+		if mask is None or serial_number not in self._sn_index:
+			raise ValueError("Board {} not managed here".format(serial_number))
+		return self._sn_index[serial_number]
 	
 	def acquire_board(self, serial_number=None):
 		with self._avail_lock:
+			mask = self._avail.mask
 			if serial_number is None:
 				#sn_rand = list(#self._boards)
 				#random.shuffle(sn_rand)
@@ -121,21 +139,28 @@ class FPGAManager:
 				#	if self._avail_dict[sn]:
 				#		serial_number = sn
 				#		break
-				sn_avail = [sn for sn, a in self._avail_dict.items() if a]
-				serial_number = random.choice(sn_avail)
+				if not mask:
+					raise IndexError("No board available")
+				index = random_set_bit(mask)
+				serial_number = self._serial_numbers[index]
+			else:
+				index = self._board_index(serial_number, mask)
 			
 			self._log.debug("acquire {}".format(serial_number))
-			self._avail_dict[serial_number] = False
+			self._avail.mask = mask & ~(1 << index)
 			
 			#return self._boards[serial_number]
 			return ManagedFPGABoard(self, serial_number, self._baudrate, self._timeout)
 	
 	def release_board(self, board):
 		with self._avail_lock:
-			if board.serial_number not in self._avail_dict:
-				raise ValueError("Can't release board {}; not managed here".format(board.serial_number))
+			mask = self._avail.mask
+			try:
+				index = self._board_index(board.serial_number, mask)
+			except ValueError as ve:
+				raise ValueError("Can't release board {}; not managed here".format(board.serial_number)) from ve
 			
-			self._avail_dict[board.serial_number] = True
+			self._avail.mask = mask | (1 << index)
 	
 	def generate_pool(self, process_count=None, log_level=None):
 		"""Generate multiprocessing.Pool from FPGAManager
@@ -148,7 +173,7 @@ class FPGAManager:
 		# optional parameter for pool size
 		if process_count is None:
 			with self._avail_lock:
-				process_count = sum(self._avail_dict.values())
+				process_count = popcount(self._avail.mask or 0)
 		
 		# more than one board in more than one process cause an segfault in libusb
 		# -> create board in initializer
@@ -166,6 +191,21 @@ class FPGAManager:
 		
 		return fpga_manager
 
+def popcount(mask):
+	"""number of set bits in a non negative integer"""
+	return bin(mask).count("1")
+
+def nth_set_bit(mask, n):
+	"""index of the n-th (starting from 0) set bit in mask"""
+	for _ in range(n):
+		# clear lowest set bit
+		mask &= mask - 1
+	return (mask & -mask).bit_length() - 1
+
+def random_set_bit(mask):
+	"""index of a set bit in mask, chosen uniformly at random"""
+	return nth_set_bit(mask, random.randrange(popcount(mask)))
+
 def set_global_fpga_board(fm, log_level=None):
 	if log_level is not None:
 		logging.basicConfig(level=log_level)
@@ -175,18 +215,6 @@ def set_global_fpga_board(fm, log_level=None):
 	
 	Finalize(gl_fpga_board, gl_fpga_board.close, exitpriority=19)
 
-def set_global_fpga_board_from_dict(fpga_manager, avail_dict, avail_lock):
-	global gl_fpga_board
-	with avail_lock:
-		sn_avail = [sn for sn, a in avail_dict.items() if a]
-		serial_number = random.choice(sn_avail)
-		
-		print("take {}".format(serial_number))
-		avail_dict[serial_number] = False
-		
-		gl_fpga_board = ManagedFPGABoard(fpga_manager, serial_number)
-	#print("global FPGA board set: {} {}".format(gl_fpga_board.serial_number, gl_fpga_board))
-
 def print_fpga_manager():
 	print(hex(id(gl_fpga_manager)), end=" ")
 
@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 
+import os
+import random
 import re
 import subprocess
-from itertools import product
-import time
 import logging
 import argparse
 
 ALLOWED_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTU"
+_ALLOWED_SET = frozenset(ALLOWED_DIGITS)
 
 KNOWN_GROUPS = {
 	"E": "Leipzig",
@@ -19,18 +20,34 @@ KNOWN_BOARDS = {
 	"8": "Lattice iCE40HX8K-B-EVN"
 }
 
+SERIAL_WEIGHTS = (13, 11, 1, 7, 5, 3)
+# required to detect all single digit errors, see test_single_errors
+assert all(w % 31 != 0 for w in SERIAL_WEIGHTS), "weights have to be coprime to 31"
+
+# value of each digit; lower case letters are accepted as by int(digit, 31)
+DIGIT_VALUES = {d: i for i, d in enumerate(ALLOWED_DIGITS)}
+DIGIT_VALUES.update({d.lower(): i for d, i in DIGIT_VALUES.items()})
+
 class MalformedSerial(Exception):
 	pass
 
 def serial_number_checksum(serial_number):
 	# compute checksum
-	weights = (13, 11, 1, 7, 5, 3)
-	mod_sum = 0
-	for i in range(6):
-		mod_sum += weights[i] * int(serial_number[i], 31)
+	# unrolled for SERIAL_WEIGHTS
+	try:
+		mod_sum = (
+			13*DIGIT_VALUES[serial_number[0]] + 11*DIGIT_VALUES[serial_number[1]] + DIGIT_VALUES[serial_number[2]] +
+			7*DIGIT_VALUES[serial_number[3]] + 5*DIGIT_VALUES[serial_number[4]] + 3*DIGIT_VALUES[serial_number[5]]
+		)
+	except KeyError as ke:
+		raise ValueError("Invalid digit {}".format(ke)) from ke
 	
 	return mod_sum % 31
 
+def values_checksum(values):
+	"""checksum of a serial number given by the values of its digits"""
+	return sum(w*v for w, v in zip(SERIAL_WEIGHTS, values)) % 31
+
 def is_valid_serial_number(serial_number):
 	try:
 		check_serial_number(serial_number)
@@ -54,13 +71,58 @@ def check_serial_number(serial_number):
 	if checksum != 0:
 		raise MalformedSerial("Invalid check digit in serial number, remainder is {}".format(checksum % 31))
 
+SYSFS_TTY_CLASS = "/sys/class/tty"
+
+def get_serial_number_sysfs(usb_serial_device):
+	"""read the serial number of the USB device providing a tty directly from sysfs
+	
+	Returns None if the serial number can't be found this way.
+	"""
+	tty_path = os.path.join(SYSFS_TTY_CLASS, os.path.basename(usb_serial_device), "device")
+	if not os.path.exists(tty_path):
+		return None
+	
+	# walk up from the tty over the interface to the USB device; stop there as hubs have serial numbers, too
+	dev_path = os.path.realpath(tty_path)
+	while not os.path.exists(os.path.join(dev_path, "idVendor")) and not os.path.exists(os.path.join(dev_path, "busnum")):
+		parent = os.path.dirname(dev_path)
+		if parent == dev_path:
+			return None
+		dev_path = parent
+	
+	try:
+		with open(os.path.join(dev_path, "serial"), "r") as serial_file:
+			return serial_file.read().strip()
+	except FileNotFoundError:
+		return None
+
 def get_serial_number(usb_serial_device):
+	serial_number = get_serial_number_sysfs(usb_serial_device)
+	if serial_number is not None:
+		return serial_number
+	
 	udevadm_out = subprocess.check_output(["udevadm", "info", "-q", "property", "{}".format(usb_serial_device)], universal_newlines=True)
 	res = re.search(r'ID_SERIAL_SHORT=(?P<serial>.*)', udevadm_out)
 	if res is None:
 		raise Exception("No serial found for {}".format(usb_serial_device))
 	return res.group("serial")
 
+def get_all_serial_numbers():
+	"""map device names to serial numbers for all devices known to udev
+	
+	Only a single udevadm call is made, so it is preferable to get_serial_number for many devices.
+	"""
+	udevadm_out = subprocess.check_output(["udevadm", "info", "--export-db"], universal_newlines=True)
+	serial_numbers = {}
+	for block in udevadm_out.split("\n\n"):
+		props = dict(re.findall(r'^E: (\w+)=(.*)$', block, re.MULTILINE))
+		try:
+			serial_numbers[props["DEVNAME"]] = props["ID_SERIAL_SHORT"]
+		except KeyError:
+			pass
+	
+	return serial_numbers
+
 def decode_serial_number(serial_number):
 	str_list = [serial_number, ":\n"]
 	
@@ -91,7 +153,7 @@ def decode_serial_number(serial_number):
 def check_digit(digit):
 	if len(digit) != 1:
 		raise ValueError("Not a single digit but {} digits".format(len(digit)))
-	if digit not in ALLOWED_DIGITS:
+	if digit not in _ALLOWED_SET:
 		raise ValueError("Invalid digit '{}'".format(digit))
 
 def create_serial_range(sequential_range, board_type="8", group="E"):
@@ -109,20 +171,13 @@ def create_serial_number(sequential_number, board_type="8", group="E"):
 	check_digit(board_type)
 	check_digit(group)
 	
-	digits = []
-	for i in range(3):
-		digits.append(ALLOWED_DIGITS[sequential_number%31])
-		sequential_number //= 31
-	digits.reverse()
-	assert sequential_number == 0, "Sequential number was too large, despite previous checks"
-	
-	tmp_serial = "{}{}0{}".format(group, board_type, "".join(digits))
-	checksum = serial_number_checksum(tmp_serial)
-	serial = tmp_serial[:2] + ALLOWED_DIGITS[(31-checksum) % 31] + tmp_serial[3:]
+	# compute with digit values, the string is only built at the end
+	rest, seq_2 = divmod(sequential_number, 31)
+	seq_0, seq_1 = divmod(rest, 31)
+	values = [DIGIT_VALUES[group], DIGIT_VALUES[board_type], 0, seq_0, seq_1, seq_2]
+	values[2] = (31-values_checksum(values)) % 31
 	
-	check_serial_number(serial)
-	
-	return serial
+	return values_to_serial(values)
 
 def check_allowed_digits(digit_string, base):
 	if len(digit_string) != base:
@@ -132,6 +187,7 @@ def check_allowed_digits(digit_string, base):
 			raise Exception("{}. digit is {} which is not equal to {}".format(i, digit_string[i], i))
 
 def test_single_errors(valid_serial):
+	"""count the single digit alterations of a serial number that lead to a valid checksum"""
 	errors = 0
 	for i in range(6):
 		prefix = valid_serial[:i]
@@ -145,31 +201,25 @@ def test_single_errors(valid_serial):
 			if checksum == 0:
 				logging.error("Valid checksum for altered number {} (originally {})".format(tmp_serial, valid_serial))
 				errors += 1
-			
+	
 	return errors
 
-def test_all_serials():
+def values_to_serial(values):
+	return "".join(ALLOWED_DIGITS[v] for v in values)
+
+def test_all_serials(count=48, rng=random):
+	"""test a random sample of valid serial numbers for single digit errors
+	
+	The weights are coprime to 31, so no valid serial number has a valid single digit alteration and a sample
+	suffices as sanity check of the checksum.
+	"""
 	errors = 0
-	count = 0
-	todo = pow(len(ALLOWED_DIGITS), 5)
-	start_time = time.time()
-	last_time = start_time
-	# construct serial
-	for d in product(ALLOWED_DIGITS, repeat=5):
-		count += 1
-		#create_serial_number()
-		tmp_serial = "".join(d[:2]) + "0" + "".join(d[2:])
-		checksum = serial_number_checksum(tmp_serial)
-		current_serial = tmp_serial[:2] + ALLOWED_DIGITS[(31-checksum) % 31] +tmp_serial[3:]
-		# test serial
-		errors += test_single_errors(current_serial)
-		
-		if time.time() - last_time > 60:
-			last_time = time.time()
-			passed_time = last_time-start_time
-			eta = int(passed_time/count*todo)
-			logging.info("current {} , {} of {} after {} s, {} s remaining (from {})".format(current_serial, count, todo, int(passed_time), eta-int(passed_time), eta))
-		
+	for prefix in rng.sample(range(pow(len(ALLOWED_DIGITS), 5)), count):
+		# group, board type and sequential number
+		group, rest = divmod(prefix, pow(31, 4))
+		board, seq = divmod(rest, pow(31, 3))
+		serial_number = create_serial_number(seq, ALLOWED_DIGITS[board], ALLOWED_DIGITS[group])
+		errors += test_single_errors(serial_number)
 	
 	return errors
 
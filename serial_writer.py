@@ -3,6 +3,7 @@
 import pyftdi
 from pyftdi.usbtools import UsbTools
 from pyftdi.ftdi import Ftdi
+import usb.core
 import binascii
 from array import array
 import struct
@@ -12,6 +13,9 @@ import argparse
 import re
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+
 import serial_utils
 
 StringPosition = collections.namedtuple("StringPosition", ["offset", "length"])
@@ -37,15 +41,31 @@ class SerialWriter(Ftdi):
 		return self.usb_dev.ctrl_transfer(Ftdi.REQ_IN, Ftdi.SIO_READ_EEPROM, 0, index, 2, self.usb_read_timeout)
 	
 	def read_eeprom(self):
-		eeprom = array("B")
-		for index in range(self.EEPROM_SIZE//2):
+		"""read the whole EEPROM
+		
+		First the whole EEPROM is requested in a single control transfer. Chips that only return a single word
+		per request (like the FT2232H) or reject the larger request are read word by word, continuing after the
+		data of the first request.
+		"""
+		try:
+			data = self.usb_dev.ctrl_transfer(Ftdi.REQ_IN, Ftdi.SIO_READ_EEPROM, 0, 0, self.EEPROM_SIZE, self.usb_read_timeout)
+		except usb.core.USBError:
+			data = b""
+		eeprom = array("B", data)
+		if len(eeprom) == self.EEPROM_SIZE:
+			return eeprom
+		
+		# only complete words are used
+		del eeprom[len(eeprom)//2*2:]
+		for index in range(len(eeprom)//2, self.EEPROM_SIZE//2):
 			word = self.read_eeprom_word(index)
 			eeprom.extend(word)
 		
 		return eeprom
 	
 	def _write_eeprom_word(self, index, word):
-		self.log.debug("EEPROM word 0x{:02x} write {}".format(index, binascii.hexlify(word)))
+		if self.log.isEnabledFor(logging.DEBUG):
+			self.log.debug("EEPROM word 0x{:02x} write {}".format(index, binascii.hexlify(word)))
 		value = struct.unpack("<H", word)[0]
 		return self.usb_dev.ctrl_transfer(Ftdi.REQ_OUT, Ftdi.SIO_WRITE_EEPROM, value, index, 2, self.usb_read_timeout)
 	
@@ -93,8 +113,7 @@ class SerialWriter(Ftdi):
 		else:
 			# preexisting serial number
 			# clear serial number, legacy port and PnP
-			for addr in range(eeprom[0x12], eeprom[0x12]+eeprom[0x13]+3):
-				eeprom[addr] = 0x00
+			eeprom[eeprom[0x12]:eeprom[0x12]+eeprom[0x13]+3] = array("B", bytes(eeprom[0x13]+3))
 			overwritten = True
 		
 		# write new serial number
@@ -104,16 +123,10 @@ class SerialWriter(Ftdi):
 		eeprom[serial_pos.offset] = serial_pos.length
 		eeprom[serial_pos.offset+1] = 0x03
 		
+		# string descriptor is UTF-16LE, followed by legacy port and PnP
+		payload = serial_number.encode("utf-16-le") + b"\x02\x03\x00"
 		addr = serial_pos.offset + 2
-		for char in serial_number:
-			eeprom[addr] = ord(char)
-			eeprom[addr+1] = 0x00
-			addr += 2
-		
-		# write legacy port and PnP
-		for value in (0x02, 0x03, 0x00):
-			eeprom[addr] = value
-			addr += 1
+		eeprom[addr:addr+len(payload)] = array("B", payload)
 		
 		# update checksum
 		checksum = cls.eeprom_checksum(eeprom)
@@ -125,8 +138,9 @@ class SerialWriter(Ftdi):
 	@staticmethod
 	def eeprom_checksum(eeprom):
 		checksum = 0xaaaa
-		for i in range(len(eeprom)//2-1):
-			word = struct.unpack("<H", eeprom[2*i:2*i+2])[0]
+		# all words except the checksum itself
+		words = struct.unpack_from("<{}H".format(len(eeprom)//2-1), eeprom)
+		for word in words:
 			#print("{:04x}".format(word))
 			checksum ^= word
 			checksum = ((checksum << 1) | (checksum >> 15)) & 0xffff
@@ -155,9 +169,12 @@ class SerialWriter(Ftdi):
 	
 	@classmethod
 	def check_eeprom_strings(cls, eeprom):
-		# get offsets and length
-		manufacturer_pos = StringPosition(eeprom[0x0e], eeprom[0x0f])
-		product_pos = StringPosition(eeprom[0x10], eeprom[0x11])
+		# get flags, offsets and length from the header
+		(
+			flags, manufacturer_offset, manufacturer_length, product_offset, product_length, serial_offset, serial_length
+		) = struct.unpack_from("<10xB3x6B", eeprom)
+		manufacturer_pos = StringPosition(manufacturer_offset, manufacturer_length)
+		product_pos = StringPosition(product_offset, product_length)
 		
 		# check individual consistency
 		cls.check_string(eeprom, *manufacturer_pos)
@@ -168,13 +185,13 @@ class SerialWriter(Ftdi):
 		assert product_pos.offset == sum(manufacturer_pos), "Product string doesn't start directly after manufacturer string"
 		
 		# check optional serial number
-		if eeprom[0x0a] & cls.USE_SERIAL == 0:
+		if flags & cls.USE_SERIAL == 0:
 			# no serial number set
-			assert eeprom[0x12] == 0x00, "Serial number not used but offset set"
-			assert eeprom[0x13] == 0x00, "Serial number not used but length set"
+			assert serial_offset == 0x00, "Serial number not used but offset set"
+			assert serial_length == 0x00, "Serial number not used but length set"
 		else:
 			# serial number set
-			serial_pos = StringPosition(eeprom[0x12], eeprom[0x13])
+			serial_pos = StringPosition(serial_offset, serial_length)
 			cls.check_string(eeprom, *serial_pos)
 			
 			assert serial_pos.offset == sum(product_pos), "Serial number doesn't start directly after product string"
@@ -207,12 +224,15 @@ def create_argument_parser():
 	arg_read.set_defaults(func=read_eeprom)
 	
 	arg_sn = sub_parser.add_parser("serial_number", aliases=["sn"])
-	arg_sn.add_argument("-d", "--device", default=None, type=parse_device, help="specification of the USB device in the form bus:address")
+	# a single device and all devices exclude each other
+	arg_target = arg_sn.add_mutually_exclusive_group()
+	arg_target.add_argument("-d", "--device", default=None, type=parse_device, help="specification of the USB device in the form bus:address")
 	arg_sn.add_argument("-i", "--interactive", action="store_true", help="run in interactive mode")
 	arg_sn.add_argument("-g", "--group", default="E", type=str, choices=serial_utils.ALLOWED_DIGITS, help="organizational group the device belongs to")
 	arg_sn.add_argument("-b", "--board_type", default="8", type=str, choices=serial_utils.ALLOWED_DIGITS, help="type of the physical device")
 	arg_sn.add_argument("-s", "--sequential", default=0, type=int, help="sequential number")
 	arg_sn.add_argument("-a", "--already", action="store_true", help="flash even if a serial number is already set")
+	arg_target.add_argument("--all", action="store_true", help="set consecutive serial numbers for all suitable devices in parallel")
 	arg_sn.set_defaults(func=set_serial_number)
 	
 	return arg_parser
@@ -303,6 +323,27 @@ def set_serial_number(arguments):
 			finally:
 				dev.close()
 		
+	elif arguments.all:
+		devices = SerialWriter.find_lattice()
+		if not arguments.already:
+			devices = [d for d in devices if d.sn is None]
+		if len(devices) == 0:
+			logging.error("No suitable device connected")
+			sys.exit(-1)
+		
+		serial_list = serial_utils.create_serial_range(
+			range(arguments.sequential, arguments.sequential+len(devices)),
+			arguments.board_type,
+			arguments.group
+		)
+		# each device has its own handle, so the USB transfers of different devices overlap
+		with ThreadPoolExecutor(max_workers=len(devices)) as executor:
+			list(executor.map(
+				provision_device,
+				[DeviceNode(d.bus, d.address) for d in devices],
+				serial_list,
+				repeat(arguments.already)
+			))
 	else:
 		# find device
 		if arguments.device is None:
@@ -318,21 +359,25 @@ def set_serial_number(arguments):
 		else:
 			desc = arguments.device
 		
-		dev = SerialWriter()
-		dev.open_from_url("ftdi://::{:x}:{:x}/1".format(desc.bus, desc.address))
 		serial_number = serial_utils.create_serial_number(
 			arguments.sequential,
 			arguments.board_type,
 			arguments.group
 		)
-		logging.info("Set serial unumber for device at bus {}, address {} to {}".format(desc.bus, desc.address, serial_number))
-		try:
-			dev.set_serial_number_device(serial_number, arguments.already)
-		except ExistingSerialError:
-			logging.error("Device already has serial number. Don't overwrite.")
-		finally:
-			dev.close()
-		
+		provision_device(desc, serial_number, arguments.already)
+
+def provision_device(desc, serial_number, already):
+	"""set the serial number of a single device"""
+	dev = SerialWriter()
+	dev.open_from_url("ftdi://::{:x}:{:x}/1".format(desc.bus, desc.address))
+	logging.info("Set serial unumber for device at bus {}, address {} to {}".format(desc.bus, desc.address, serial_number))
+	try:
+		dev.set_serial_number_device(serial_number, already)
+	except ExistingSerialError:
+		logging.error("Device at bus {}, address {} already has serial number. Don't overwrite.".format(desc.bus, desc.address))
+	finally:
+		dev.close()
+
 
 if __name__ == "__main__":
 	logging.basicConfig(level=logging.DEBUG)
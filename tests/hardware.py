@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+import functools
+import unittest
+
+from ..fpga_board import FPGABoard
+
+@functools.lru_cache(maxsize=None)
+def suitable_serial_numbers():
+	"""serial numbers of suitable boards, enumerated only once per test run"""
+	return tuple(FPGABoard.get_suitable_serial_numbers())
+
+def requires_boards(test_func):
+	"""skip the test if no suitable boards are connected
+	
+	In contrast to unittest.skipIf the boards are enumerated when the test runs and not when the module is imported.
+	"""
+	@functools.wraps(test_func)
+	def wrapper(*args, **kwargs):
+		if len(suitable_serial_numbers()) < 1:
+			raise unittest.SkipTest("no suitable boards found")
+		return test_func(*args, **kwargs)
+	
+	return wrapper
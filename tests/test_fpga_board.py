@@ -3,14 +3,19 @@
 import os
 import sys
 from array import array
-import random
+import subprocess
+import tempfile
 import unittest.mock as mock
 import unittest
 
-from pyftdi.usbtools import UsbDeviceDescriptor
+from contextlib import ExitStack
+
+from pyftdi.ftdi import Ftdi
+from pyftdi.usbtools import UsbDeviceDescriptor, UsbTools
 
 from ..configuration import Configuration
 from ..fpga_board import FPGABoard
+from .hardware import requires_boards
 
 class FPGABoardTest(unittest.TestCase):
 	@staticmethod
@@ -31,7 +36,7 @@ class FPGABoardTest(unittest.TestCase):
 		self.dev_list.append(
 			(UsbDeviceDescriptor(0x0403, 0x6010, 2, 7, other_sn, 0, "second valid board"), 2)
 		)
-		with mock.patch("pyftdi.ftdi.Ftdi.find_all", side_effect=lambda v, p: self.dev_list):
+		with mock.patch("pyftdi.ftdi.Ftdi.find_all", side_effect=lambda v, p: self.dev_list), mock.patch.object(FPGABoard, "find_ft2232_devices_sysfs", return_value=None):
 			res = FPGABoard.get_suitable_serial_numbers()
 			
 			set_res = set(res)
@@ -41,12 +46,179 @@ class FPGABoardTest(unittest.TestCase):
 	def test_get_suitable_board(self):
 		baudrate = 968123
 		timeout = 8.1
-		with mock.patch("pyftdi.ftdi.Ftdi.find_all", side_effect=lambda v, p: self.dev_list), mock.patch.object(FPGABoard, "__init__", autospec=True, return_value=None) as mock_init:
+		with mock.patch("pyftdi.ftdi.Ftdi.find_all", side_effect=lambda v, p: self.dev_list), mock.patch.object(FPGABoard, "find_ft2232_devices_sysfs", return_value=None), mock.patch.object(FPGABoard, "__init__", autospec=True, return_value=None) as mock_init:
 			res = FPGABoard.get_suitable_board(baudrate, timeout)
 			
 			mock_init.assert_called_once_with(res, self.valid_sn, baudrate, timeout)
 	
-	@unittest.skipIf(len(FPGABoard.get_suitable_serial_numbers())<1, "no suitable boards found")
+	def test_find_ft2232_devices_sysfs(self):
+		with tempfile.TemporaryDirectory() as sysfs_dir:
+			def add_device(name, attrs):
+				dev_path = os.path.join(sysfs_dir, name)
+				os.mkdir(dev_path)
+				for attr_name, value in attrs.items():
+					with open(os.path.join(dev_path, attr_name), "w") as attr_file:
+						attr_file.write(f"{value}\n")
+			
+			for i, (desc, i_count) in enumerate(self.dev_list):
+				add_device(f"3-{i}", {
+					"idVendor": "0403", "idProduct": "6010", "busnum": desc.bus, "devnum": desc.address,
+					"serial": desc.sn, "product": desc.description, "bNumInterfaces": f" {i_count}",
+				})
+			# interface of a device
+			add_device("3-0:1.0", {"bInterfaceNumber": "00"})
+			# other device
+			add_device("3-5", {
+				"idVendor": "0403", "idProduct": "6001", "busnum": 3, "devnum": 9, "serial": "T8P002",
+				"product": "other", "bNumInterfaces": " 1",
+			})
+			
+			with mock.patch.object(FPGABoard, "SYSFS_USB_DEVICES", sysfs_dir):
+				res = FPGABoard.find_ft2232_devices_sysfs()
+				suitable = FPGABoard.get_suitable_serial_numbers()
+		
+		self.assertEqual({(d._replace(index=None), i) for d, i in self.dev_list}, set(res))
+		self.assertEqual([self.valid_sn], suitable)
+		
+		with mock.patch.object(FPGABoard, "SYSFS_USB_DEVICES", os.path.join(sysfs_dir, "missing")):
+			self.assertIsNone(FPGABoard.find_ft2232_devices_sysfs())
+	
+	def test_find_ft2232_devices(self):
+		class FakeDevice:
+			def __init__(self, desc, i_count):
+				self.desc = desc
+				self.i_count = i_count
+				self.idVendor = desc.vid
+				self.idProduct = desc.pid
+				self.bus = desc.bus
+				self.address = desc.address
+				self.iSerialNumber = 1
+				self.iProduct = 2
+			
+			def __iter__(self):
+				return iter([mock.Mock(bNumInterfaces=self.i_count)])
+		
+		fake_devices = [FakeDevice(d, i) for d, i in self.dev_list]
+		def get_string(device, index):
+			return device.desc.sn if index == 1 else device.desc.description
+		
+		with mock.patch.object(UsbTools, "_find_devices", return_value=set(fake_devices)), mock.patch.object(UsbTools, "get_string", side_effect=get_string):
+			res = FPGABoard.find_ft2232_devices()
+		
+		# find_all doesn't set an index
+		self.assertEqual({(d._replace(index=None), i) for d, i in self.dev_list}, set(res))
+		
+		# fallback if the private API of pyftdi changed
+		for error in (AttributeError, TypeError):
+			with self.subTest(error=error):
+				with mock.patch.object(UsbTools, "_find_devices", side_effect=error), \
+					mock.patch("pyftdi.ftdi.Ftdi.find_all", return_value=self.dev_list) as mock_find_all:
+					res = FPGABoard.find_ft2232_devices()
+				
+				mock_find_all.assert_called_once_with([(0x0403, 0x6010)], True)
+				self.assertEqual(self.dev_list, res)
+	
+	def create_mock_board(self, stack):
+		"""create FPGABoard without USB access, the patches are active as long as the stack"""
+		stack.enter_context(mock.patch("pyftdi.serialext.serial_for_url"))
+		stack.enter_context(mock.patch.object(Ftdi, "open_mpsse_from_url"))
+		
+		return FPGABoard(self.valid_sn)
+	
+	def test_defer_flushes(self):
+		with ExitStack() as stack:
+			fpga = self.create_mock_board(stack)
+			uart = fpga.uart
+			
+			# without deferring the buffers are reset immediately
+			fpga.reset_buffer()
+			uart.reset_input_buffer.assert_called_once_with()
+			uart.reset_output_buffer.assert_called_once_with()
+			
+			uart.reset_mock()
+			with fpga.defer_flushes():
+				fpga.reset_buffer()
+				fpga.flush()
+				with fpga.defer_flushes():
+					fpga.reset_buffer()
+					fpga.flush()
+				
+				# input is reset immediately to protect the following reads, output is deferred
+				self.assertEqual(2, uart.reset_input_buffer.call_count)
+				uart.reset_output_buffer.assert_not_called()
+				uart.flush.assert_not_called()
+			
+			self.assertEqual(2, uart.reset_input_buffer.call_count)
+			uart.reset_output_buffer.assert_called_once_with()
+			uart.flush.assert_called_once_with()
+	
+	def test_flash_bitstream_command(self):
+		bitstream_path = self.get_data("echo_fpga.bin")
+		with open(bitstream_path, "rb") as bin_file:
+			bitstream = bin_file.read()
+		
+		# expected MPSSE commands
+		direction = FPGABoard.SCK|FPGABoard.MOSI|FPGABoard.CS|FPGABoard.CRESET
+		exp = bytearray((
+			Ftdi.SET_BITS_LOW, FPGABoard.SCK|FPGABoard.MOSI, direction,
+			Ftdi.SET_BITS_LOW, FPGABoard.SCK|FPGABoard.MOSI|FPGABoard.CRESET, direction,
+			Ftdi.SET_BITS_LOW, FPGABoard.MOSI|FPGABoard.CS|FPGABoard.CRESET, direction,
+			Ftdi.CLK_BITS_NO_DATA, 0x07,
+			Ftdi.SET_BITS_LOW, FPGABoard.MOSI|FPGABoard.CRESET, direction,
+		))
+		for i in range(0, len(bitstream), 4096):
+			data = bitstream[i:i+4096]
+			exp.extend((Ftdi.WRITE_BYTES_NVE_MSB, (len(data)-1) & 0xff, (len(data)-1) >> 8))
+			exp.extend(data)
+		exp.extend((
+			Ftdi.SET_BITS_LOW, FPGABoard.MOSI|FPGABoard.CS|FPGABoard.CRESET, direction,
+			Ftdi.CLK_BYTES_NO_DATA, 0x0b, 0x00, Ftdi.CLK_BITS_NO_DATA, 0x03,
+			Ftdi.CLK_BYTES_NO_DATA, 0x05, 0x00, Ftdi.CLK_BITS_NO_DATA, 0x00,
+			Ftdi.SET_BITS_LOW, direction, direction,
+		))
+		
+		written = bytearray()
+		chunk_sizes = []
+		def write_data(ftdi, data):
+			written.extend(data)
+			chunk_sizes.append(ftdi.write_data_get_chunksize())
+			return len(data)
+		
+		with ExitStack() as stack:
+			fpga = self.create_mock_board(stack)
+			stack.enter_context(mock.patch.object(Ftdi, "write_data", autospec=True, side_effect=write_data))
+			stack.enter_context(mock.patch.object(Ftdi, "read_data_bytes", return_value=bytes([FPGABoard.CDONE])))
+			stack.enter_context(mock.patch.object(FPGABoard, "usleep"))
+			
+			fpga.flash_bitstream(bitstream)
+			
+			# bitstream sent with large transfers, chunk size restored afterwards
+			self.assertEqual(FPGABoard.FLASH_TRANSFER_SIZE, chunk_sizes[-1])
+			self.assertEqual(chunk_sizes[0], fpga._mpsse_dev.write_data_get_chunksize())
+			
+			# only a single write after the bitstream
+			self.assertEqual(4, len(chunk_sizes))
+		
+		# remove CDONE requests
+		cdone_req = bytes((Ftdi.GET_BITS_LOW, Ftdi.SEND_IMMEDIATE))
+		self.assertEqual(cdone_req, written[:2])
+		del written[:2]
+		self.assertEqual(cdone_req, written[-2:])
+		del written[-2:]
+		
+		self.assertEqual(exp, written)
+	
+	def test_no_int_subprocess(self):
+		# subprocess runs in its own session and stderr is merged into the output
+		res = FPGABoard.no_int_subprocess([sys.executable, "-c", "import os, sys; print(os.getsid(0)); print('err', file=sys.stderr)"])
+		sid, err = res.split()
+		self.assertNotEqual(os.getsid(0), int(sid))
+		self.assertEqual("err", err)
+		
+		with self.assertRaises(subprocess.CalledProcessError):
+			FPGABoard.no_int_subprocess([sys.executable, "-c", "import sys; sys.exit(1)"])
+	
+	@requires_boards
 	def test_flash_bitstream_file(self):
 		"""
 		:avocado: tags=hil
@@ -55,12 +227,12 @@ class FPGABoardTest(unittest.TestCase):
 		bitstream_path = self.get_data("echo_fpga.bin")
 		with FPGABoard.get_suitable_board() as fpga:
 			fpga.flash_bitstream_file(bitstream_path)
-			data = bytes(random.choices(range(256), k=data_length))
+			data = os.urandom(data_length)
 			fpga.uart.write(data)
 			read_data = fpga.uart.read(data_length)
 			self.assertEqual(data, read_data, "Received data differs from send data; Echo botstream not working")
 	
-	@unittest.skipIf(len(FPGABoard.get_suitable_serial_numbers())<1, "no suitable boards found")
+	@requires_boards
 	def test_flash_bitstream(self):
 		"""
 		:avocado: tags=hil
@@ -72,12 +244,12 @@ class FPGABoardTest(unittest.TestCase):
 		
 		with FPGABoard.get_suitable_board() as fpga:
 			fpga.flash_bitstream(bitstream)
-			data = bytes(random.choices(range(256), k=data_length))
+			data = os.urandom(data_length)
 			fpga.uart.write(data)
 			read_data = fpga.uart.read(data_length)
 			self.assertEqual(data, read_data, "Received data differs from send data; Echo botstream not working")
 	
-	@unittest.skipIf(len(FPGABoard.get_suitable_serial_numbers())<1, "no suitable boards found")
+	@requires_boards
 	def test_configure(self):
 		"""
 		:avocado: tags=hil
@@ -90,7 +262,7 @@ class FPGABoardTest(unittest.TestCase):
 		
 		with FPGABoard.get_suitable_board() as fpga:
 			fpga.configure(config)
-			data = bytes(random.choices(range(256), k=data_length))
+			data = os.urandom(data_length)
 			fpga.uart.write(data)
 			read_data = fpga.uart.read(data_length)
 			self.assertEqual(data, read_data, "Received data differs from send data; Echo botstream not working")
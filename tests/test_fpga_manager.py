@@ -20,12 +20,27 @@ sys.path.append(
 	)
 )
 
-from ..fpga_manager import get_fpga_board, FPGAManager
+from ..fpga_manager import get_fpga_board, nth_set_bit, random_set_bit, FPGAManager
 from ..fpga_board import FPGABoard
 from ..serial_utils import is_valid_serial_number
+from .hardware import requires_boards
 
 class FPGAManagerTest(unittest.TestCase):
-	def generate_creation_data_set(self, valid, invalid):
+	@classmethod
+	def setUpClass(cls):
+		# deterministic, so it is shared by all tests; don't modify
+		cls._default_dev_list, cls._default_sn_list = cls.generate_creation_data_set(5, 3)
+		cls._invalid_sn_list = [e[0].sn for e in cls._default_dev_list if not is_valid_serial_number(e[0].sn)]
+	
+	def setUp(self):
+		# device enumeration is patched once per test, the tests only set the device list
+		self._dev_list = []
+		patcher = mock.patch.object(FPGABoard, "find_ft2232_devices", side_effect=lambda: self._dev_list)
+		self._find_devices = patcher.start()
+		self.addCleanup(patcher.stop)
+	
+	@staticmethod
+	def generate_creation_data_set(valid, invalid):
 		"""Generate data set for FPGAManger creation
 		
 		valid: number of viable device descriptors
@@ -75,26 +90,26 @@ class FPGAManagerTest(unittest.TestCase):
 		baudrate = 968123
 		timeout = 8.1
 		
-		with mock.patch("pyftdi.ftdi.Ftdi.find_all", side_effect=lambda v, p: dev_list):
-			res = FPGAManager.create_manager(min_nr, max_nr, requested_serial_numbers, baudrate, timeout)
-			
-			if expected_serial_numbers is None:
-				# don't check generated serial numbers
-				return
-			
-			created_sn_list = list(res._avail_dict)
-			created_sn_set = set(created_sn_list)
-			self.assertEqual(len(created_sn_list), len(created_sn_set), "Serial numbers added multiple times")
-			expected_sn_set = set(expected_serial_numbers)
-			self.assertEqual(expected_sn_set, created_sn_set, "Serial numbers of created managed boards differ from expected")
+		self._dev_list = dev_list
+		res = FPGAManager.create_manager(min_nr, max_nr, requested_serial_numbers, baudrate, timeout)
 		
+		if expected_serial_numbers is None:
+			# don't check generated serial numbers
+			return
+		
+		created_sn_list = list(res._serial_numbers)
+		created_sn_set = set(created_sn_list)
+		self.assertEqual(len(created_sn_list), len(created_sn_set), "Serial numbers added multiple times")
+		expected_sn_set = set(expected_serial_numbers)
+		self.assertEqual(expected_sn_set, created_sn_set, "Serial numbers of created managed boards differ from expected")
+	
 	
 	def generic_creation_error_test(self, expected_exception, dev_list, min_nr, max_nr, requested_serial_numbers):
 		with self.assertRaises(expected_exception):
 			self.generic_creation_test(None, dev_list, min_nr, max_nr, requested_serial_numbers)
 	
 	def test_creation(self):
-		dev_list, sn_list = self.generate_creation_data_set(5, 3)
+		dev_list, sn_list = self._default_dev_list, self._default_sn_list
 		
 		# no requested, no upper limit
 		self.generic_creation_test(sn_list, dev_list, 1, 0, [])
@@ -124,7 +139,7 @@ class FPGAManagerTest(unittest.TestCase):
 		self.generic_creation_test(sn_list[:3], dev_list, 2, 3, sn_list[:3])
 	
 	def test_creation_input_error(self):
-		dev_list, sn_list = self.generate_creation_data_set(5, 3)
+		dev_list, sn_list = self._default_dev_list, self._default_sn_list
 		
 		# too low minimum
 		self.generic_creation_error_test(ValueError, dev_list, 0, 0, [])
@@ -139,11 +154,10 @@ class FPGAManagerTest(unittest.TestCase):
 		self.generic_creation_error_test(ValueError, dev_list, 0, 0, sn_list[:3]+sn_list[1:2])
 		
 		# requested serial number not valid
-		invalid_sn = [e[0].sn for e in dev_list if not is_valid_serial_number(e[0].sn)]
-		self.generic_creation_error_test(ValueError, dev_list, 1, 0, sn_list+invalid_sn[:1])
+		self.generic_creation_error_test(ValueError, dev_list, 1, 0, sn_list+self._invalid_sn_list[:1])
 	
 	def test_creation_unavailable_error(self):
-		dev_list, sn_list = self.generate_creation_data_set(5, 3)
+		dev_list, sn_list = self._default_dev_list, self._default_sn_list
 		
 		# minimum not reached
 		self.generic_creation_error_test(OSError, dev_list, 6, 0, [])
@@ -156,11 +170,52 @@ class FPGAManagerTest(unittest.TestCase):
 		red_dev_list = list(map(lambda e: (e[0], 1) if e[0].sn==sn_list[1] else e, dev_list))
 		self.generic_creation_error_test(OSError, red_dev_list, 1, 0, sn_list[:3])
 	
+	def test_acquire_release(self):
+		dev_list, sn_list = self._default_dev_list, self._default_sn_list
+		
+		def init_board(board, serial_number, baudrate, timeout):
+			board._serial_number = serial_number
+		
+		self._dev_list = dev_list
+		with mock.patch.object(FPGABoard, "__init__", init_board):
+			fm = FPGAManager.create_manager()
+			
+			# acquire requested board
+			board = fm.acquire_board(sn_list[2])
+			self.assertEqual(sn_list[2], board.serial_number)
+			
+			# acquire all remaining boards
+			rand_boards = [fm.acquire_board() for _ in range(len(sn_list)-1)]
+			self.assertEqual(set(sn_list)-{sn_list[2]}, {b.serial_number for b in rand_boards})
+			with self.assertRaises(IndexError):
+				fm.acquire_board()
+			
+			# release and acquire again
+			fm.release_board(board)
+			self.assertEqual(sn_list[2], fm.acquire_board().serial_number)
+			fm.release_board(board)
+			for rand_board in rand_boards:
+				fm.release_board(rand_board)
+			
+			fm.close()
+			self.assertEqual(0, len(fm))
+			with self.assertRaises(ValueError):
+				fm.release_board(board)
+	
+	def test_set_bit_selection(self):
+		for mask in (0b1, 0b1000, 0b10110010, (1 << 80) | (1 << 3)):
+			with self.subTest(mask=mask):
+				set_bits = [i for i in range(mask.bit_length()) if (mask >> i) & 1]
+				self.assertEqual(set_bits, [nth_set_bit(mask, n) for n in range(len(set_bits))])
+				
+				for _ in range(20):
+					self.assertIn(random_set_bit(mask), set_bits)
+	
 	def run_ga(self, toolbox):
 		pop = toolbox.init_pop(n=10)
 		algorithms.eaSimple(pop, toolbox, cxpb=0.5, mutpb=0.1, ngen=5)
 	
-	@unittest.skipIf(len(FPGABoard.get_suitable_serial_numbers())<1, "no suitable boards found")
+	@requires_boards
 	def test_multi(self):
 		toolbox = create_toolbox()
 		# add the directory of this file to the path so pickle can find this module when pickling
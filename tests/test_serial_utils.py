@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import tempfile
+import unittest
+
+from contextlib import ExitStack
+from unittest import mock
+
+from .. import serial_utils
+from ..serial_utils import ALLOWED_DIGITS, DIGIT_VALUES, check_serial_number, create_serial_number, get_all_serial_numbers, get_serial_number, get_serial_number_sysfs, serial_number_checksum
+
+class SerialUtilsTest(unittest.TestCase):
+	def test_serial_number_checksum(self):
+		weights = (13, 11, 1, 7, 5, 3)
+		rng = random.Random(31)
+		for _ in range(1000):
+			serial_number = "".join(rng.choices(ALLOWED_DIGITS+ALLOWED_DIGITS.lower(), k=6))
+			expected = sum(w*int(d, 31) for w, d in zip(weights, serial_number)) % 31
+			self.assertEqual(expected, serial_number_checksum(serial_number))
+		
+		with self.assertRaises(ValueError):
+			serial_number_checksum("E8V001")
+	
+	def test_create_serial_number(self):
+		expected = ['T80000', 'T8S001', 'T8P002', 'T8M003', 'T8J004', 'T8G005', 'T8D006', 'T8A007', 'T87008', 'T84009']
+		self.assertEqual(expected, [create_serial_number(i, "8", "T") for i in range(len(expected))])
+		self.assertEqual("E86001", create_serial_number(1))
+		
+		for seq in (0, 30, 31, 961, pow(31, 3)-1):
+			serial_number = create_serial_number(seq, "U", "0")
+			check_serial_number(serial_number)
+			self.assertEqual(seq, int(serial_number[3:], 31))
+		
+		for args in ((-1, ), (pow(31, 3), ), (0, "V"), (0, "8", "e")):
+			with self.assertRaises(ValueError):
+				create_serial_number(*args)
+	
+	def test_single_errors(self):
+		def reference(serial_number):
+			errors = 0
+			for i in range(6):
+				for s in ALLOWED_DIGITS:
+					if s != serial_number[i] and serial_number_checksum(serial_number[:i]+s+serial_number[i+1:]) == 0:
+						errors += 1
+			return errors
+		
+		rng = random.Random(13)
+		for _ in range(50):
+			# valid serial number
+			serial_number = create_serial_number(rng.randrange(pow(31, 3)), rng.choice(ALLOWED_DIGITS), rng.choice(ALLOWED_DIGITS))
+			self.assertEqual(0, serial_utils.test_single_errors(serial_number))
+			
+			# arbitrary serial number
+			serial_number = "".join(rng.choices(ALLOWED_DIGITS, k=6))
+			with self.assertLogs(level="ERROR") if serial_number_checksum(serial_number) else ExitStack():
+				self.assertEqual(reference(serial_number), serial_utils.test_single_errors(serial_number))
+	
+	def test_all_serials(self):
+		self.assertEqual(0, serial_utils.test_all_serials(rng=random.Random(5)))
+		
+		# the harness detects a checksum that ignores the last digit
+		def weak_checksum(serial_number):
+			return sum(w*DIGIT_VALUES[d] for w, d in zip((13, 11, 1, 7, 5, 0), serial_number)) % 31
+		
+		with mock.patch.object(serial_utils, "serial_number_checksum", weak_checksum), self.assertLogs(level="ERROR"):
+			self.assertLess(0, serial_utils.test_all_serials(rng=random.Random(5)))
+	
+	def test_get_serial_number(self):
+		def write_attr(dev_path, name, value):
+			with open(os.path.join(dev_path, name), "w") as attr_file:
+				attr_file.write(f"{value}\n")
+		
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			# hub with a serial number and two devices below it, only one of them has a serial number
+			hub_dev = os.path.join(tmp_dir, "devices", "usb1")
+			os.makedirs(hub_dev)
+			write_attr(hub_dev, "busnum", 1)
+			write_attr(hub_dev, "serial", "0000:00:14.0")
+			
+			tty_class = os.path.join(tmp_dir, "tty")
+			for usb_name, tty_name, serial_number in (("1-1", "ttyUSB1", "E86001"), ("1-2", "ttyUSB2", None)):
+				usb_dev = os.path.join(hub_dev, usb_name)
+				port_dev = os.path.join(usb_dev, f"{usb_name}:1.1", tty_name)
+				os.makedirs(port_dev)
+				write_attr(usb_dev, "idVendor", "0403")
+				if serial_number is not None:
+					write_attr(usb_dev, "serial", serial_number)
+				os.makedirs(os.path.join(tty_class, tty_name))
+				os.symlink(port_dev, os.path.join(tty_class, tty_name, "device"))
+			
+			with ExitStack() as stack:
+				stack.enter_context(mock.patch.object(serial_utils, "SYSFS_TTY_CLASS", tty_class))
+				mock_check = stack.enter_context(mock.patch("subprocess.check_output", return_value="ID_SERIAL_SHORT=E8S002\n"))
+				
+				self.assertEqual("E86001", get_serial_number("/dev/ttyUSB1"))
+				mock_check.assert_not_called()
+				
+				# device without serial number doesn't get the one of the hub
+				self.assertIsNone(get_serial_number_sysfs("/dev/ttyUSB2"))
+				
+				# fallback to udevadm
+				self.assertEqual("E8S002", get_serial_number("/dev/ttyUSB2"))
+				mock_check.assert_called_once()
+				
+				mock_check.reset_mock()
+				self.assertEqual("E8S002", get_serial_number("/dev/ttyUSB0"))
+				mock_check.assert_called_once()
+	
+	def test_get_all_serial_numbers(self):
+		udevadm_out = (
+			"P: /devices/pci0000:00/0000:00:14.0/usb1/1-1/1-1:1.0/ttyUSB0/tty/ttyUSB0\n"
+			"N: ttyUSB0\n"
+			"E: DEVNAME=/dev/ttyUSB0\n"
+			"E: ID_SERIAL_SHORT=E86001\n"
+			"\n"
+			"P: /devices/pci0000:00/0000:00:14.0/usb1/1-2\n"
+			"E: ID_SERIAL_SHORT=E8S002\n"
+			"E: DEVNAME=/dev/bus/usb/001/003\n"
+			"\n"
+			"P: /devices/virtual/tty/tty0\n"
+			"E: DEVNAME=/dev/tty0\n"
+		)
+		with mock.patch("subprocess.check_output", return_value=udevadm_out) as mock_check:
+			res = get_all_serial_numbers()
+			mock_check.assert_called_once()
+		
+		self.assertEqual({"/dev/ttyUSB0": "E86001", "/dev/bus/usb/001/003": "E8S002"}, res)
@@ -1,11 +1,25 @@
 #!/usr/bin/env python3
 
+import errno
 import os
 from array import array
 import json
 import unittest
+import unittest.mock as mock
 
-from ..serial_writer import SerialWriter
+import usb.core
+from pyftdi.ftdi import Ftdi
+from pyftdi.usbtools import UsbDeviceDescriptor
+
+try:
+	# faster parsing of the JSON data files
+	import orjson as json_parser
+except ImportError:
+	json_parser = json
+
+from .. import serial_writer
+from ..serial_utils import create_serial_range
+from ..serial_writer import DeviceNode, SerialWriter
 
 class SerialWriterTest(unittest.TestCase):
 	@staticmethod
@@ -18,11 +32,21 @@ class SerialWriterTest(unittest.TestCase):
 		self.without_serial = "eeprom_no_serial.bin"
 		self.serial = "E86001"
 	
+	# raw content of the EEPROM files, read only once
+	_eeprom_data = {}
+	
 	def eeprom_from_file(self, filename):
-		path = self.get_data(filename, must_exist=True)
-		with open(path, "rb") as eeprom_file:
-			eeprom = array("B", eeprom_file.read())
+		try:
+			data = self._eeprom_data[filename]
+		except KeyError:
+			path = self.get_data(filename, must_exist=True)
+			with open(path, "rb") as eeprom_file:
+				data = eeprom_file.read()
+			self._eeprom_data[filename] = data
 		
+		# new array for every call as the tests modify it
+		eeprom = array("B")
+		eeprom.frombytes(data)
 		return eeprom
 	
 	def generic_good_check_test(self, test_func):
@@ -46,35 +70,37 @@ class SerialWriterTest(unittest.TestCase):
 		
 		SerialWriter.set_serial_number_eeprom(eeprom, self.serial)
 		
-		self.assertEqual(expected, eeprom, "Writing serial number had unexpected result")
+		self.assertEqual(expected.tobytes(), eeprom.tobytes(), "Writing serial number had unexpected result")
 		
 		# overwrite own number -> no change expected
 		eeprom = self.eeprom_from_file(self.with_serial)
 		
 		SerialWriter.set_serial_number_eeprom(eeprom, self.serial)
 		
-		self.assertEqual(expected, eeprom, "Writing serial number had unexpected result")
+		self.assertEqual(expected.tobytes(), eeprom.tobytes(), "Writing serial number had unexpected result")
 	
 	def test_serial_number_length(self):
 		original = self.eeprom_from_file(self.without_serial)
 		start = original[0x10] + original[0x11]
 		limit = 0xf6
 		
+		# reuse a single buffer and serial number string
+		eeprom = original[:]
+		max_serial_number = "f"*((0x100-start)//2)
+		
 		for length in range(1, (limit-start)//2):
-			eeprom = original[:]
-			serial_number = "f"*length
-			SerialWriter.set_serial_number_eeprom(eeprom, serial_number)
+			eeprom[:] = original
+			SerialWriter.set_serial_number_eeprom(eeprom, max_serial_number[:length])
 		
 		for length in range((limit-start)//2, (0x100-start)//2):
-			eeprom = original[:]
-			serial_number = "f"*length
+			eeprom[:] = original
 			with self.assertRaises(AssertionError):
-				SerialWriter.set_serial_number_eeprom(eeprom, serial_number)
+				SerialWriter.set_serial_number_eeprom(eeprom, max_serial_number[:length])
 	
 	def test_assertions_in_checks(self):
 		path = self.get_data("faulty_eeprom.json", must_exist=True)
-		with open(path, "r") as json_file:
-			case_dict = json.load(json_file)
+		with open(path, "rb") as json_file:
+			case_dict = json_parser.loads(json_file.read())
 		
 		for filename, faulty in case_dict.items():
 			eeprom = self.eeprom_from_file(filename)
@@ -89,3 +115,62 @@ class SerialWriterTest(unittest.TestCase):
 						check_func(eeprom)
 				else:
 					check_func(eeprom)
+	
+	def test_read_eeprom(self):
+		expected = self.eeprom_from_file(self.with_serial)
+		
+		# bulk: whole EEPROM in one request, word_only: only a word per request, stall: larger requests fail
+		for mode in ("bulk", "word_only", "stall"):
+			with self.subTest(mode=mode):
+				def ctrl_transfer(req_type, req, value, index, length, timeout):
+					if mode == "stall" and length > 2:
+						raise usb.core.USBError("Pipe error", errno.EPIPE)
+					if mode == "word_only":
+						length = 2
+					return expected[index*2:index*2+length]
+				
+				usb_dev = mock.Mock()
+				usb_dev.ctrl_transfer.side_effect = ctrl_transfer
+				with mock.patch.object(SerialWriter, "usb_dev", new_callable=mock.PropertyMock, return_value=usb_dev), \
+					mock.patch.object(SerialWriter, "usb_read_timeout", 5000, create=True), \
+					mock.patch.object(Ftdi, "SIO_READ_EEPROM", 0x90, create=True):
+					eeprom = SerialWriter().read_eeprom()
+				
+				self.assertEqual(expected.tobytes(), eeprom.tobytes())
+				exp_count = {"bulk": 1, "word_only": SerialWriter.EEPROM_SIZE//2, "stall": SerialWriter.EEPROM_SIZE//2+1}[mode]
+				self.assertEqual(exp_count, usb_dev.ctrl_transfer.call_count)
+	
+	def test_set_serial_number_all(self):
+		devices = [
+			UsbDeviceDescriptor(0x0403, 0x6010, 1, address, sn, 0, "Lattice FTUSB Interface Cable")
+			for address, sn in ((2, None), (3, "E86001"), (4, None), (5, None))
+		]
+		
+		for already in (False, True):
+			with self.subTest(already=already):
+				args = ["sn", "--all", "-s", "5"] + (["-a"] if already else [])
+				arguments = serial_writer.create_argument_parser().parse_args(args)
+				with mock.patch.object(SerialWriter, "find_lattice", return_value=devices), \
+					mock.patch.object(serial_writer, "provision_device") as mock_provision:
+					arguments.func(arguments)
+				
+				# devices with serial number only provisioned if requested, each with its own serial number
+				exp_devices = [d for d in devices if already or d.sn is None]
+				exp_serials = create_serial_range(range(5, 5+len(exp_devices)))
+				self.assertEqual(len(exp_serials), len(set(exp_serials)))
+				expected = [(DeviceNode(d.bus, d.address), s, already) for d, s in zip(exp_devices, exp_serials)]
+				# provisioned in parallel, so the call order is arbitrary
+				self.assertEqual(expected, sorted(c.args for c in mock_provision.call_args_list))
+		
+		# a single device and all devices can't be requested at the same time
+		with mock.patch("sys.stderr"), self.assertRaises(SystemExit):
+			serial_writer.create_argument_parser().parse_args(["sn", "--all", "-d", "1:2"])
+		
+		# no suitable device
+		arguments = serial_writer.create_argument_parser().parse_args(["sn", "--all"])
+		with mock.patch.object(SerialWriter, "find_lattice", return_value=devices[1:2]), \
+			mock.patch.object(serial_writer, "provision_device") as mock_provision, \
+			self.assertLogs(level="ERROR"), \
+			self.assertRaises(SystemExit):
+			arguments.func(arguments)
+		mock_provision.assert_not_called()